@@ -1,11 +1,71 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session
+from flask import Flask, render_template, request, jsonify, redirect, url_for, session, make_response
+from flask.json.provider import JSONProvider
+from flask_session import Session
+from collections import Counter
+from dataclasses import dataclass
 from datetime import datetime
+import hashlib
+import os
 import re
 
+import ahocorasick
+import orjson
+
+from functools import lru_cache
+
 from db import find_culture_in_text, get_planting_info, get_soil_recommendations
 
+# La base est petite et en lecture seule : un cache LRU en mémoire évite
+# l'aller-retour SQLite pour les questions répétées. Les résultats ne sont
+# jamais modifiés par les appelants.
+find_culture_in_text = lru_cache(maxsize=512)(find_culture_in_text)
+get_planting_info = lru_cache(maxsize=128)(get_planting_info)
+get_soil_recommendations = lru_cache(maxsize=512)(get_soil_recommendations)
+
+class ORJSONProvider(JSONProvider):
+    """Sérialisation JSON via orjson (C + SIMD), bien plus rapide que la stdlib."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 app = Flask(__name__)
 app.secret_key = 'votre_cle_secrete_ici_123456'  # Changez ceci en production
+app.json = ORJSONProvider(app)
+
+# Session côté serveur : le cookie ne porte plus qu'un identifiant,
+# la conversation n'est plus sérialisée/signée à chaque réponse
+app.config['SESSION_TYPE'] = 'filesystem'
+Session(app)
+
+# Nombre maximal de tours conservés dans la session
+MAX_CONVERSATION_TURNS = 50
+
+
+@dataclass(slots=True)
+class Turn:
+    """Un tour de conversation — plus compact qu'un dict à 5 clés."""
+    user: str
+    bot: str
+    score: float
+    source: str
+    timestamp: str
+
+# Motif compilé une seule fois pour le gras Markdown (**texte**)
+_BOLD_RE = re.compile(r"\*\*(.+?)\*\*")
+
+# Noms des mois (index 1-12), figés dans un tuple au niveau module
+_MOIS_NOMS = (
+    "", "janvier", "février", "mars", "avril", "mai", "juin",
+    "juillet", "août", "septembre", "octobre", "novembre", "décembre"
+)
+
+# Table de repli des accents : un seul str.translate par requête,
+# bien plus rapide qu'une normalisation unicodedata complète
+_ACCENT_TABLE = str.maketrans("àâäéèêëïîôöùûüç", "aaaeeeeiioouuuc")
 
 # Initialiser la conversation dans la session
 def get_conversation():
@@ -17,42 +77,62 @@ def get_conversation():
 def index():
     """Page d'accueil du chatbot"""
     conversation = get_conversation()
+    # ETag dérivé de la conversation : si elle n'a pas changé, on répond
+    # 304 sans repasser par Jinja (coûteux sur un long historique)
+    etag = hashlib.blake2b(repr(conversation).encode(), digest_size=8).hexdigest()
+    if etag in request.if_none_match:
+        return '', 304
     # Ajouter la date et l'heure actuelles pour le message de bienvenue
-    return render_template('index.html', 
+    resp = make_response(render_template('index.html',
                          conversation=conversation,
-                         now=datetime.now())
+                         now=datetime.now()))
+    resp.set_etag(etag)
+    return resp
 
 @app.route('/', methods=['POST'])
 def chat():
     """Traiter les messages de l'utilisateur"""
     user_input = request.form.get('input', '').strip()
-    
+
     if not user_input:
         return redirect(url_for('index'))
-    
-    # Traiter le message
-    bot_response, confidence, source = process_user_message(user_input)
-    
+
+    # Traiter le message (une seule mise en minuscules par requête)
+    user_input_lower = user_input.lower()
+    bot_response, confidence, source = process_user_message(user_input, user_input_lower)
+
+    # Horodatage calculé une seule fois par requête
+    timestamp = datetime.now().strftime('%H:%M')
+
     # Ajouter à la conversation
     conversation = get_conversation()
-    conversation.append({
-        'user': user_input,
-        'bot': bot_response,
-        'score': round(confidence * 100, 1),
-        'source': source,
-        'timestamp': datetime.now().strftime('%H:%M')
-    })
-    session['conversation'] = conversation
-    
-    # Si la requête est une requête AJAX, renvoyer une réponse JSON
-    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+    conversation.append(Turn(
+        user=user_input,
+        bot=bot_response,
+        score=round(confidence * 100, 1),
+        source=source,
+        timestamp=timestamp,
+    ))
+    if len(conversation) > MAX_CONVERSATION_TURNS:
+        del conversation[:-MAX_CONVERSATION_TURNS]
+    session.modified = True
+
+    # Si le client préfère du JSON (AJAX), renvoyer une réponse JSON.
+    # Calculé une seule fois ; l'en-tête Accept est le vrai signal de
+    # protocole, l'ancien X-Requested-With reste accepté.
+    accept = request.accept_mimetypes
+    wants_json = (
+        accept['application/json'] > accept['text/html']
+        or request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+    )
+    if wants_json:
         return jsonify({
             'status': 'success',
             'bot_response': bot_response,
             'confidence': f"{confidence:.2f}",
-            'timestamp': datetime.now().strftime('%H:%M')
+            'timestamp': timestamp
         })
-    
+
     return redirect(url_for('index'))
 
 @app.route('/reset')
@@ -70,68 +150,15 @@ def format_response(text: str) -> str:
     """
     if not text:
         return ""
-    html = text.replace("\n", "<br>")
-    html = re.sub(r"\*\*(.+?)\*\*", r"<strong>\1</strong>", html)
-    return html
+    return _BOLD_RE.sub(r"<strong>\1</strong>", text.replace("\n", "<br>"))
 
-def process_user_message(user_input):
-    """
-    Traite le message de l'utilisateur et retourne une réponse
-    
-    Args:
-        user_input (str): Message de l'utilisateur
-    
-    Returns:
-        tuple: (réponse, score_confiance, source)
-    """
-    user_input_lower = user_input.lower()
-    
-    # Réponses personnalisées pour les salutations
-    salutations = ['bonjour', 'salut', 'coucou', 'hello', 'hey', 'bonsoir']
-    if any(salut in user_input_lower for salut in salutations):
-        resp = "Bonjour ! Comment puis-je vous aider avec votre exploitation agricole aujourd'hui ? 🚜"
-        return format_response(resp), 0.95, "salutation"
-
-    # 1) Conseils de plantation personnalisés basés sur SQLite
-    plantation_keywords = ['planter', 'plantation', 'semer', 'semis', 'quand', 'période']
-    if any(kw in user_input_lower for kw in plantation_keywords):
-        culture_name = find_culture_in_text(user_input_lower)
-        if culture_name:
-            periods = get_planting_info(culture_name)
-            if periods:
-                mois_noms = [
-                    "", "janvier", "février", "mars", "avril", "mai", "juin",
-                    "juillet", "août", "septembre", "octobre", "novembre", "décembre"
-                ]
-                lignes = []
-                duree = periods[0].get("duree_cycle_jours")
-                for p in periods:
-                    debut = mois_noms[p["mois_debut"]]
-                    fin = mois_noms[p["mois_fin"]]
-                    lignes.append(
-                        f"• **Région {p['region']}** : {debut.capitalize()} - {fin}."
-                    )
-                    if p.get("conseils"):
-                        lignes.append(f"  → {p['conseils']}")
 
-                duree_txt = f"\n\n⏱️ Durée approximative du cycle : **{duree} jours**." if duree else ""
-                réponse = (
-                    f"📅 **Périodes de plantation pour le {culture_name} :**\n\n"
-                    + "\n".join(lignes)
-                    + duree_txt
-                )
-                return format_response(réponse), 0.96, "base SQLite (cultures)"
-
-    # 2) Conseils en fonction du type de sol (SQLite)
-    sol_response = get_soil_recommendations(user_input_lower)
-    if sol_response:
-        return format_response(sol_response), 0.93, "base SQLite (sols)"
-    
-    # Base de connaissances agricoles (générique, hors plantation ciblée)
-    knowledge_base = {
-        'maladies': {
-            'keywords': ['maladie', 'signes', 'symptôme', 'feuille', 'jaune', 'tache', 'malade'],
-            'response': """🌿 **Signes courants de maladies des plantes:**
+# Base de connaissances agricoles (générique, hors plantation ciblée),
+# construite une seule fois à l'import du module
+KNOWLEDGE_BASE = {
+    'maladies': {
+        'keywords': ['maladie', 'signes', 'symptôme', 'feuille', 'jaune', 'tache', 'malade'],
+        'response': """🌿 **Signes courants de maladies des plantes:**
 
 • **Feuilles jaunies**: Manque d'azote ou problème d'arrosage
 • **Taches brunes/noires**: Infections fongiques
@@ -140,28 +167,28 @@ def process_user_message(user_input):
 • **Déformation des feuilles**: Virus ou carences
 
 💡 **Conseil**: Inspectez régulièrement vos plants et isolez immédiatement les plants malades.""",
-            'confidence': 0.92,
-            'source': 'Base de données agricole'
-        },
-        'meteo': {
-            'keywords': ['météo', 'temps', 'pluie', 'sécheresse', 'prévision', 'climat', 'température'],
-            'response': """🌤️ **Prévisions météorologiques:**
+        'confidence': 0.92,
+        'source': 'Base de données agricole'
+    },
+    'meteo': {
+        'keywords': ['météo', 'temps', 'pluie', 'sécheresse', 'prévision', 'climat', 'température'],
+        'response': """🌤️ **Prévisions météorologiques:**
 
 📍 **Ouagadougou, Centre:**
 • **Aujourd'hui**: Ensoleillé, 32-35°C
 • **Cette semaine**: Temps sec, pas de pluie
 • **Tendance**: Période sèche continue
 
-⚠️ **Alerte sécheresse**: 
+⚠️ **Alerte sécheresse**:
 • Irrigation recommandée 2-3x/semaine
 • Paillage pour conserver l'humidité
 • Surveillance accrue des cultures""",
-            'confidence': 0.88,
-            'source': 'Service météo'
-        },
-        'parasites': {
-            'keywords': ['parasite', 'insecte', 'lutte', 'protection', 'ravageur', 'chenille', 'puceron', 'criquet'],
-            'response': """🐛 **Lutte contre les parasites:**
+        'confidence': 0.88,
+        'source': 'Service météo'
+    },
+    'parasites': {
+        'keywords': ['parasite', 'insecte', 'lutte', 'protection', 'ravageur', 'chenille', 'puceron', 'criquet'],
+        'response': """🐛 **Lutte contre les parasites:**
 
 **Méthodes naturelles:**
 • Rotation des cultures (espacer 3-4 ans)
@@ -177,12 +204,12 @@ def process_user_message(user_input):
 • Inspection 2x/semaine
 • Élimination plants infectés
 • Espacement correct (aération)""",
-            'confidence': 0.91,
-            'source': 'Guide phytosanitaire'
-        },
-        'irrigation': {
-            'keywords': ['eau', 'arrosage', 'irrigation', 'arroser', 'goutte', 'pompe'],
-            'response': """💧 **Gestion de l'irrigation:**
+        'confidence': 0.91,
+        'source': 'Guide phytosanitaire'
+    },
+    'irrigation': {
+        'keywords': ['eau', 'arrosage', 'irrigation', 'arroser', 'goutte', 'pompe'],
+        'response': """💧 **Gestion de l'irrigation:**
 
 **Besoins en eau (Burkina Faso):**
 • Saison sèche: 20-30L/m²/semaine
@@ -198,12 +225,12 @@ def process_user_message(user_input):
 • Légumes: 2-3x/semaine
 • Céréales: 1-2x/semaine
 • Arbres fruitiers: 1x/semaine""",
-            'confidence': 0.93,
-            'source': 'Manuel irrigation'
-        },
-        'sol': {
-            'keywords': ['sol', 'terre', 'compost', 'engrais', 'fertilisant', 'ph', 'amendement'],
-            'response': """🌱 **Gestion et amélioration du sol:**
+        'confidence': 0.93,
+        'source': 'Manuel irrigation'
+    },
+    'sol': {
+        'keywords': ['sol', 'terre', 'compost', 'engrais', 'fertilisant', 'ph', 'amendement'],
+        'response': """🌱 **Gestion et amélioration du sol:**
 
 **Sols du Burkina Faso:**
 • Ferrugineux tropicaux (80%)
@@ -219,12 +246,12 @@ def process_user_message(user_input):
 **Test sol simple:**
 • Vinaigre = pétille → sol calcaire
 • Ne pétille pas → sol acide""",
-            'confidence': 0.90,
-            'source': 'Pédologie agricole'
-        },
-        'recolte': {
-            'keywords': ['récolte', 'récolter', 'cueillir', 'maturité', 'rendement', 'conservation'],
-            'response': """🌾 **Guide de récolte:**
+        'confidence': 0.90,
+        'source': 'Pédologie agricole'
+    },
+    'recolte': {
+        'keywords': ['récolte', 'récolter', 'cueillir', 'maturité', 'rendement', 'conservation'],
+        'response': """🌾 **Guide de récolte:**
 
 **Signes de maturité:**
 • **Maïs**: Soies brunies, grains fermes
@@ -242,39 +269,123 @@ def process_user_message(user_input):
 • Greniers surélevés (rongeurs)
 • Température fraîche
 • Inspection régulière""",
-            'confidence': 0.89,
-            'source': 'Guide post-récolte'
-        }
+        'confidence': 0.89,
+        'source': 'Guide post-récolte'
     }
-    
-    # Recherche de la meilleure correspondance
-    best_match = None
-    max_matches = 0
-    
-    for category, data in knowledge_base.items():
-        matches = sum(1 for keyword in data['keywords'] if keyword in user_input_lower)
-        if matches > max_matches:
-            max_matches = matches
-            best_match = data
-    
-    # Retourner la réponse appropriée
-    if best_match and max_matches > 0:
-        return format_response(best_match['response']), best_match['confidence'], best_match['source']
+}
+
+# Mots-clés déclenchant la branche plantation, repliés eux aussi
+_PLANTATION_KEYWORDS = ('planter', 'plantation', 'semer', 'semis', 'quand', 'periode')
+
+# Automate Aho-Corasick construit à l'import sur l'ensemble des mots-clés,
+# chaque motif étant étiqueté avec sa catégorie : un seul parcours linéaire
+# du message donne les correspondances de toutes les catégories à la fois,
+# en retrouvant la sémantique sous-chaîne (les pluriels comptent à nouveau).
+# Les déclencheurs de la branche plantation sont fusionnés dans le même
+# automate (tag 'plantation') : plus aucun second balayage du texte.
+_KEYWORD_AUTOMATON = ahocorasick.Automaton()
+for _category, _data in KNOWLEDGE_BASE.items():
+    for _kw in _data['keywords']:
+        _KEYWORD_AUTOMATON.add_word(_kw.translate(_ACCENT_TABLE), _category)
+for _kw in _PLANTATION_KEYWORDS:
+    _KEYWORD_AUTOMATON.add_word(_kw, 'plantation')
+_KEYWORD_AUTOMATON.make_automaton()
+
+# Salutations reconnues : test O(1) sur le premier mot du message
+# (et pas de faux positif sur « salutaire », « heyday »...)
+_SALUTATIONS = frozenset({'bonjour', 'salut', 'coucou', 'hello', 'hey', 'bonsoir'})
+
+# Les réponses statiques sont converties en HTML une seule fois à l'import :
+# plus aucun passage regex par requête pour les réponses en conserve
+for _data in KNOWLEDGE_BASE.values():
+    _data['response_html'] = format_response(_data['response'])
+
+_SALUT_HTML = format_response(
+    "Bonjour ! Comment puis-je vous aider avec votre exploitation agricole aujourd'hui ? 🚜"
+)
+
+_DEFAULT_HTML = format_response(
+    "🤔 Je ne suis pas sûr de bien comprendre votre question.\n\n"
+    "**Je peux vous aider sur :**\n"
+    "• 📅 Calendrier de plantation\n"
+    "• 🌿 Maladies des plantes\n"
+    "• 🌤️ Météo et sécheresse\n"
+    "• 🐛 Lutte contre les parasites\n"
+    "• 💧 Irrigation\n"
+    "• 🌱 Amélioration du sol\n"
+    "• 🌾 Récolte\n\n"
+    "Posez-moi une question précise sur l'un de ces sujets."
+)
+
+
+def process_user_message(user_input, user_input_lower=None):
+    """
+    Traite le message de l'utilisateur et retourne une réponse
+
+    Args:
+        user_input (str): Message de l'utilisateur
+        user_input_lower (str): Version minuscule déjà calculée par l'appelant
+            (évite un second parcours unicode de la chaîne)
+
+    Returns:
+        tuple: (réponse, score_confiance, source)
+    """
+    if user_input_lower is None:
+        user_input_lower = user_input.lower()
+    # Version ASCII repliée pour les comparaisons de mots-clés
+    normalized = user_input_lower.translate(_ACCENT_TABLE)
+
+    # Réponses personnalisées pour les salutations (premier mot uniquement)
+    first_word = user_input_lower.split(None, 1)[0] if user_input_lower else ''
+    if first_word.strip('!,.?') in _SALUTATIONS:
+        return _SALUT_HTML, 0.95, "salutation"
+
+    # Un unique parcours de l'automate classe le message pour toutes les
+    # intentions à la fois (plantation + catégories de la base de
+    # connaissances) ; les branches suivantes ne relisent plus le texte.
+    scores = Counter(category for _, category in _KEYWORD_AUTOMATON.iter(normalized))
+
+    # 1) Conseils de plantation personnalisés basés sur SQLite
+    if scores.pop('plantation', 0):
+        culture_name = find_culture_in_text(user_input_lower)
+        if culture_name:
+            periods = get_planting_info(culture_name)
+            if periods:
+                # Une seule liste de lignes, un seul join terminal :
+                # pas de concaténations intermédiaires
+                duree = periods[0].get("duree_cycle_jours")
+                lignes = [f"📅 **Périodes de plantation pour le {culture_name} :**", ""]
+                for p in periods:
+                    debut = _MOIS_NOMS[p["mois_debut"]]
+                    fin = _MOIS_NOMS[p["mois_fin"]]
+                    lignes.append(
+                        f"• **Région {p['region']}** : {debut.capitalize()} - {fin}."
+                    )
+                    if p.get("conseils"):
+                        lignes.append(f"  → {p['conseils']}")
+
+                if duree:
+                    lignes += ["", f"⏱️ Durée approximative du cycle : **{duree} jours**."]
+                réponse = "\n".join(lignes)
+                return format_response(réponse), 0.96, "base SQLite (cultures)"
+
+    # 2) Conseils en fonction du type de sol (SQLite)
+    sol_response = get_soil_recommendations(user_input_lower)
+    if sol_response:
+        return format_response(sol_response), 0.93, "base SQLite (sols)"
+
+    # Recherche de la meilleure correspondance parmi les catégories
+    if scores:
+        best_category, max_matches = scores.most_common(1)[0]
+    else:
+        best_category, max_matches = None, 0
+
+    # Retourner la réponse appropriée (HTML pré-rendu à l'import)
+    if max_matches > 0:
+        best_match = KNOWLEDGE_BASE[best_category]
+        return best_match['response_html'], best_match['confidence'], best_match['source']
     else:
-        # Réponse par défaut simple
-        default_response = (
-            "🤔 Je ne suis pas sûr de bien comprendre votre question.\n\n"
-            "**Je peux vous aider sur :**\n"
-            "• 📅 Calendrier de plantation\n"
-            "• 🌿 Maladies des plantes\n"
-            "• 🌤️ Météo et sécheresse\n"
-            "• 🐛 Lutte contre les parasites\n"
-            "• 💧 Irrigation\n"
-            "• 🌱 Amélioration du sol\n"
-            "• 🌾 Récolte\n\n"
-            "Posez-moi une question précise sur l'un de ces sujets."
-        )
-        return format_response(default_response), 0.50, 'Système'
+        return _DEFAULT_HTML, 0.50, 'Système'
 
 @app.template_filter('format_datetime')
 def format_datetime(value, format='%d/%m/%Y %H:%M'):
@@ -286,7 +397,9 @@ def format_datetime(value, format='%d/%m/%Y %H:%M'):
 # Ajout du filtre à l'application
 app.jinja_env.filters['datetime'] = format_datetime
 
+# Exécution directe : serveur de développement uniquement.
+# En production, passer par wsgi.py (gunicorn + workers gevent).
 if __name__ == '__main__':
     print("🌾 Démarrage du Chatbot Agriculture Intelligente...")
     print("📍 URL: http://127.0.0.1:5000")
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    app.run(debug=os.getenv('FLASK_DEBUG') == '1', host='0.0.0.0', port=5000)
@@ -1,4 +1,9 @@
 import sqlite3
+import threading
+
+import ahocorasick
+from contextlib import contextmanager
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional, Dict, Any, List
 
@@ -6,72 +11,149 @@ from typing import Optional, Dict, Any, List
 # Base SQLite simple dédiée au chatbot (ne modifie pas un ancien fichier database.db)
 DB_PATH = Path("agri_data.db")
 
+# Une connexion par thread (ou greenlet sous gevent), réutilisée entre les
+# appels : ouvrir une connexion SQLite par requête coûtait plus cher que
+# les petites requêtes elles-mêmes
+_local = threading.local()
+
+# Réglages appliqués une seule fois à l'ouverture de chaque connexion
+_CONNECT_PRAGMAS = """
+PRAGMA journal_mode=WAL;
+PRAGMA synchronous=NORMAL;
+PRAGMA temp_store=MEMORY;
+PRAGMA cache_size=-20000;
+PRAGMA mmap_size=268435456;
+PRAGMA busy_timeout=5000;
+PRAGMA foreign_keys=ON;
+"""
+
 
 def get_connection() -> sqlite3.Connection:
-    """Retourne une connexion SQLite vers la base locale."""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    """Retourne la connexion SQLite du thread courant (créée au premier appel)."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        # cached_statements relevé : toutes nos requêtes sont des littéraux
+        # stables, le cache de statements compilés doit tous les garder
+        conn = sqlite3.connect(DB_PATH, cached_statements=256)
+        conn.row_factory = sqlite3.Row
+        conn.executescript(_CONNECT_PRAGMAS)
+        _local.conn = conn
     return conn
 
 
+@contextmanager
+def transaction():
+    """
+    Transaction explicite : un seul BEGIN IMMEDIATE / COMMIT pour tout le
+    bloc, au lieu d'un fsync par instruction.
+    """
+    conn = get_connection()
+    conn.execute("BEGIN IMMEDIATE")
+    # Vérification des clés étrangères repoussée au COMMIT : les insertions
+    # du bloc peuvent se faire table par table, dans n'importe quel ordre
+    # (le pragma se réarme tout seul à la fin de la transaction)
+    conn.execute("PRAGMA defer_foreign_keys = ON")
+    try:
+        yield conn
+    except Exception:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+def close_connection() -> None:
+    """Ferme la connexion du thread courant (arrêt propre / tests)."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+
+# Schéma complet, parsé et exécuté en un seul executescript :
+# tables minimales puis index des chemins de lecture chauds
+# (périodes par culture, et lecture inverse sols -> cultures couverte
+# par (sol_id, culture_id) pour se servir entièrement dans l'index).
+_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS cultures (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    nom TEXT UNIQUE NOT NULL,
+    type_culture TEXT,
+    duree_cycle_jours INTEGER,
+    description TEXT
+);
+
+CREATE TABLE IF NOT EXISTS periodes_plantation (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    culture_id INTEGER NOT NULL,
+    region TEXT NOT NULL,          -- ex: 'Centre', 'Nord', 'Sud'
+    mois_debut INTEGER NOT NULL,   -- 1-12
+    mois_fin INTEGER NOT NULL,     -- 1-12
+    conseils TEXT,
+    FOREIGN KEY (culture_id) REFERENCES cultures (id)
+);
+
+CREATE TABLE IF NOT EXISTS sols (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    nom TEXT UNIQUE NOT NULL,      -- ex: 'sablonneux', 'argilo-limoneux'
+    description TEXT
+);
+
+CREATE TABLE IF NOT EXISTS culture_sols (
+    culture_id INTEGER NOT NULL,
+    sol_id INTEGER NOT NULL,
+    PRIMARY KEY (culture_id, sol_id),
+    FOREIGN KEY (culture_id) REFERENCES cultures (id),
+    FOREIGN KEY (sol_id) REFERENCES sols (id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_periodes_culture
+    ON periodes_plantation (culture_id);
+
+CREATE INDEX IF NOT EXISTS idx_culture_sols_sol
+    ON culture_sols (sol_id, culture_id);
+
+-- L'index UNIQUE sur nom est en collation BINARY : la recherche
+-- insensible à la casse (nom = ? COLLATE NOCASE) a besoin du sien
+CREATE INDEX IF NOT EXISTS idx_cultures_nom_nocase
+    ON cultures (nom COLLATE NOCASE);
+"""
+
+
 def init_db() -> None:
     """Crée les tables minimales si elles n'existent pas."""
-    with get_connection() as conn:
-        cur = conn.cursor()
+    get_connection().executescript(_SCHEMA_SQL)
 
-        # Table des cultures de base
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS cultures (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nom TEXT UNIQUE NOT NULL,
-                type_culture TEXT,
-                duree_cycle_jours INTEGER,
-                description TEXT
-            )
-            """
-        )
 
-        # Périodes de plantation par culture / région simple
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS periodes_plantation (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                culture_id INTEGER NOT NULL,
-                region TEXT NOT NULL,          -- ex: 'Centre', 'Nord', 'Sud'
-                mois_debut INTEGER NOT NULL,   -- 1-12
-                mois_fin INTEGER NOT NULL,     -- 1-12
-                conseils TEXT,
-                FOREIGN KEY (culture_id) REFERENCES cultures (id)
-            )
-            """
-        )
+@lru_cache(maxsize=1)
+def _ensure_initialized() -> None:
+    """Crée et alimente la base au premier accès réel (pas à l'import).
 
-        # Types de sol simples
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS sols (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nom TEXT UNIQUE NOT NULL,      -- ex: 'sablonneux', 'argilo-limoneux'
-                description TEXT
-            )
-            """
-        )
+    Importer le module ne touche plus le disque ; seuls les chemins qui
+    lisent effectivement la base paient l'initialisation, une fois.
+    """
+    init_db()
+    seed_basic_data()
 
-        # Association cultures <-> sols
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS culture_sols (
-                culture_id INTEGER NOT NULL,
-                sol_id INTEGER NOT NULL,
-                PRIMARY KEY (culture_id, sol_id),
-                FOREIGN KEY (culture_id) REFERENCES cultures (id),
-                FOREIGN KEY (sol_id) REFERENCES sols (id)
-            )
-            """
-        )
 
-        conn.commit()
+def _insert_with_ids(cur, insert_sql, rows, select_sql) -> Dict[str, int]:
+    """
+    Insère les lignes et renvoie {nom: id}.
+
+    Avec SQLite >= 3.35 les ids sont capturés via INSERT ... RETURNING,
+    sans re-scanner la table après coup ; sur une version plus ancienne,
+    on retombe sur l'executemany + SELECT d'origine.
+    """
+    if sqlite3.sqlite_version_info >= (3, 35, 0):
+        ids: Dict[str, int] = {}
+        for row in rows:
+            cur.execute(insert_sql + " RETURNING id, nom", row)
+            inserted = cur.fetchone()
+            if inserted is not None:  # OR IGNORE : ligne déjà présente
+                ids[inserted["nom"]] = inserted["id"]
+        return ids
+    cur.executemany(insert_sql, rows)
+    cur.execute(select_sql)
+    return {row["nom"]: row["id"] for row in cur.fetchall()}
 
 
 def seed_basic_data() -> None:
@@ -79,7 +161,7 @@ def seed_basic_data() -> None:
     Insère quelques cultures / périodes / sols d'exemple si la base est vide.
     Cette fonction est idempotente (ne duplique pas les données).
     """
-    with get_connection() as conn:
+    with transaction() as conn:
         cur = conn.cursor()
 
         # Vérifier s'il y a déjà des cultures
@@ -100,16 +182,16 @@ def seed_basic_data() -> None:
             ("Oignon", "maraîchère", 120, "Culture de saison sèche, sensible à l'excès d'eau."),
         ]
 
-        cur.executemany(
+        # Les ids reviennent directement avec les insertions, pour lier
+        # les périodes sans re-scanner la table
+        culture_ids = _insert_with_ids(
+            cur,
             "INSERT OR IGNORE INTO cultures (nom, type_culture, duree_cycle_jours, description) "
             "VALUES (?, ?, ?, ?)",
             cultures,
+            "SELECT id, nom FROM cultures",
         )
 
-        # Récupérer les ids pour les lier aux périodes
-        cur.execute("SELECT id, nom FROM cultures")
-        culture_ids = {row["nom"]: row["id"] for row in cur.fetchall()}
-
         periodes = [
             # culture, region, mois_debut, mois_fin, conseils
             ("Maïs", "Centre", 5, 7, "Semer dès l'installation des pluies, sur sol bien préparé."),
@@ -140,14 +222,14 @@ def seed_basic_data() -> None:
             ("argilo-limoneux", "Sols fertiles, bons pour de nombreuses cultures mais sensibles au tassement."),
             ("ferrugineux tropicaux", "Sols dominants au Burkina, souvent pauvres en matière organique."),
         ]
-        cur.executemany(
+        sol_ids = _insert_with_ids(
+            cur,
             "INSERT OR IGNORE INTO sols (nom, description) VALUES (?, ?)",
             sols,
+            "SELECT id, nom FROM sols",
         )
 
         # Associer quelques cultures à des types de sols
-        cur.execute("SELECT id, nom FROM sols")
-        sol_ids = {row["nom"]: row["id"] for row in cur.fetchall()}
 
         culture_sols = [
             ("Maïs", "ferrugineux tropicaux"),
@@ -171,40 +253,71 @@ def seed_basic_data() -> None:
             ],
         )
 
-        conn.commit()
+    # Les caches de lecture ont pu être remplis avant le seed
+    _invalidate_lookup_caches()
 
 
-def find_culture_in_text(text: str) -> Optional[str]:
-    """Essaie de retrouver le nom d'une culture mentionnée dans le texte."""
-    text_lower = text.lower()
-    with get_connection() as conn:
-        cur = conn.cursor()
+# Tables de référence (cultures, sols) : alimentées une fois par
+# seed_basic_data puis jamais modifiées en cours d'exécution. On les
+# charge donc une seule fois en mémoire au lieu de relancer le même
+# SELECT à chaque message — plus aucune I/O SQLite sur ces chemins.
+_cultures_cache: Optional["ahocorasick.Automaton"] = None
+_sols_cache: Optional[tuple] = None
+
+
+def _invalidate_lookup_caches() -> None:
+    """À appeler si les tables de référence changent (re-seed, tests)."""
+    global _cultures_cache, _sols_cache
+    _cultures_cache = None
+    _sols_cache = None
+
+
+def _get_culture_automaton() -> "ahocorasick.Automaton":
+    """Automate d'Aho-Corasick sur les noms de cultures, mis en cache.
+
+    Une seule passe O(len(texte)) quel que soit le nombre de cultures,
+    au lieu d'un test ``nom in texte`` par culture.
+    """
+    global _cultures_cache
+    if _cultures_cache is None:
+        _ensure_initialized()
+        cur = get_connection().cursor()
+        # Tuples bruts : pas d'enveloppe sqlite3.Row pour une colonne unique
+        cur.row_factory = None
         cur.execute("SELECT nom FROM cultures")
+        automaton = ahocorasick.Automaton()
         for (nom,) in cur.fetchall():
-            if nom.lower() in text_lower:
-                return nom
+            automaton.add_word(nom.lower(), nom)
+        automaton.make_automaton()
+        _cultures_cache = automaton
+    return _cultures_cache
+
+
+def find_culture_in_text(text: str) -> Optional[str]:
+    """Essaie de retrouver le nom d'une culture mentionnée dans le texte."""
+    for _, nom in _get_culture_automaton().iter(text.lower()):
+        return nom
     return None
 
 
 def get_planting_info(culture_name: str) -> Optional[List[Dict[str, Any]]]:
     """Retourne les périodes de plantation pour une culture donnée."""
-    with get_connection() as conn:
-        cur = conn.cursor()
-        cur.execute(
-            """
-            SELECT p.region, p.mois_debut, p.mois_fin, p.conseils,
-                   c.duree_cycle_jours
-            FROM periodes_plantation p
-            JOIN cultures c ON c.id = p.culture_id
-            WHERE LOWER(c.nom) = LOWER(?)
-            ORDER BY p.region
-            """,
-            (culture_name,),
-        )
-        rows = cur.fetchall()
-        if not rows:
-            return None
-        return [dict(row) for row in rows]
+    _ensure_initialized()
+    cur = get_connection().cursor()
+    cur.execute(
+        """
+        SELECT p.region, p.mois_debut, p.mois_fin, p.conseils,
+               c.duree_cycle_jours
+        FROM periodes_plantation p
+        JOIN cultures c ON c.id = p.culture_id
+        WHERE c.nom = ? COLLATE NOCASE
+        ORDER BY p.region
+        """,
+        (culture_name,),
+    )
+    # Itérer le curseur directement : une seule passe C (map) au lieu
+    # de matérialiser la liste de Rows puis de la reparcourir
+    return list(map(dict, cur)) or None
 
 
 def get_soil_recommendations(text: str) -> Optional[str]:
@@ -212,37 +325,39 @@ def get_soil_recommendations(text: str) -> Optional[str]:
     Si l'utilisateur mentionne un type de sol, renvoie une brève description
     et des cultures adaptées.
     """
+    global _sols_cache
     text_lower = text.lower()
-    with get_connection() as conn:
-        cur = conn.cursor()
-        cur.execute("SELECT id, nom, description FROM sols")
-        sols = cur.fetchall()
-
-        for sol in sols:
-            if sol["nom"] in text_lower:
-                # cultures associées
-                cur.execute(
-                    """
-                    SELECT c.nom
-                    FROM cultures c
-                    JOIN culture_sols cs ON cs.culture_id = c.id
-                    WHERE cs.sol_id = ?
-                    ORDER BY c.nom
-                    """,
-                    (sol["id"],),
-                )
-                cultures = [row["nom"] for row in cur.fetchall()]
-                cultures_txt = ", ".join(cultures) if cultures else "plusieurs cultures adaptées"
-                return (
-                    f"🌱 **Sol {sol['nom']}**\n\n"
-                    f"{sol['description']}\n\n"
-                    f"✅ Cultures adaptées : {cultures_txt}."
-                )
+    if _sols_cache is None:
+        _ensure_initialized()
+        cur = get_connection().cursor()
+        # Un seul aller-retour : chaque sol arrive avec ses cultures déjà
+        # agrégées côté SQL, plus de seconde requête après la correspondance
+        cur.execute(
+            """
+            SELECT s.nom, s.description,
+                   (
+                       SELECT group_concat(nom, ', ')
+                       FROM (
+                           SELECT c.nom
+                           FROM cultures c
+                           JOIN culture_sols cs ON cs.culture_id = c.id
+                           WHERE cs.sol_id = s.id
+                           ORDER BY c.nom
+                       )
+                   ) AS cultures
+            FROM sols s
+            """
+        )
+        _sols_cache = tuple(cur.fetchall())
+
+    for sol in _sols_cache:
+        if sol["nom"] in text_lower:
+            cultures_txt = sol["cultures"] or "plusieurs cultures adaptées"
+            return (
+                f"🌱 **Sol {sol['nom']}**\n\n"
+                f"{sol['description']}\n\n"
+                f"✅ Cultures adaptées : {cultures_txt}."
+            )
     return None
 
 
-# Initialiser la base au premier import
-init_db()
-seed_basic_data()
-
-
@@ -0,0 +1,7 @@
+"""Point d'entrée WSGI pour la production.
+
+Lancer avec plusieurs workers gevent plutôt que le serveur de dev :
+
+    gunicorn -k gevent -w $(nproc) -b 0.0.0.0:5000 wsgi:app
+"""
+from app import app  # noqa: F401